@@ -8,6 +8,7 @@ the main methods inside pypgsync.py itself.
 
 import click
 import crayons
+import os
 import time
 import sys
 
@@ -15,13 +16,26 @@ from pypgsync import pypgsync
 from pypgsync.utils import create_spinner
 
 # const: chunksize hard-limit allowed by the cli
-MAX_CHUNKSIZE = 10000
+MAX_CHUNKSIZE = 50000
+
+# const: chunksize used when none is given
+DEFAULT_CHUNKSIZE = 10000
+
+# const: approximate on-disk chunk size in MB used when none is given
+DEFAULT_TARGET_CHUNK_MB = 64
+
+# const: number of slices synced in parallel when none is given
+DEFAULT_PARALLELISM = min(8, os.cpu_count() or 1)
+
+# const: minimum number of seconds between progress spinner updates
+SPINNER_UPDATE_INTERVAL = 0.1
 
 
 def validate_chunk_size(ctx, param, value):
-    if value <= MAX_CHUNKSIZE:
+    if not 0 < value <= MAX_CHUNKSIZE:
         raise click.BadParameter(
-            'Chunksize must be lower or equal to {}'.format(MAX_CHUNKSIZE))
+            'Chunksize must be between 1 and {}'.format(MAX_CHUNKSIZE))
+    return value
 
 
 @click.group()
@@ -39,16 +53,33 @@ def cli():
               help="Hostname", show_default=True)
 @click.option('-p', '--port', required=True, default=5432, type=int,
               help="Port", show_default=True)
-@click.option('-c', '--chunksize', required=True, default=MAX_CHUNKSIZE,
-              type=int, help="Transaction chunk size".format(MAX_CHUNKSIZE),
+@click.option('-c', '--chunksize', required=True, default=DEFAULT_CHUNKSIZE,
+              type=int, help="Transaction chunk size",
+              callback=validate_chunk_size, show_default=True)
+@click.option('-m', '--target-chunk-mb', default=DEFAULT_TARGET_CHUNK_MB,
+              type=click.IntRange(1, None),
+              help="Approximate size of each chunk in MB, as stored by "
+                   "postgres, lowering chunksize for tables with wide rows. "
+                   "Once fetched, chunks take several times as much memory",
               show_default=True)
+@click.option('-j', '--parallelism', default=DEFAULT_PARALLELISM,
+              type=click.IntRange(1, None),
+              help="Number of slices to sync in parallel, for syncs large "
+                   "enough to make up for the extra processes. An "
+                   "interrupted parallel run resumes from the first slice it "
+                   "didn't finish", show_default="one per CPU, up to 8")
+@click.option('--unsafe-fast', is_flag=True,
+              help="Don't wait for each chunk to be flushed to disk on the "
+                   "destination db. If it crashes, the latest chunks may be "
+                   "lost and will be synced again on the next run")
 @click.argument('source_db')
 @click.argument('destination_db')
 @click.argument('tablename')
 @click.argument('username')
 @click.password_option()
 def single(hostname, port, source_db, destination_db, tablename,
-           username, password, chunksize):
+           username, password, chunksize, target_chunk_mb, parallelism,
+           unsafe_fast):
     """Single-time mode will sync table data, loading data up until the time
     execution has started, using the updated_at column as a reference point.
     After this criteria is met, the script will exit.
@@ -58,7 +89,8 @@ def single(hostname, port, source_db, destination_db, tablename,
         str(crayons.white('Starting single-time mode… ᕙ(⇀‸↼‶)ᕗ', bold=True)))
 
     sync(hostname, port, source_db, destination_db, tablename,
-         username, password, chunksize)
+         username, password, chunksize, target_chunk_mb, parallelism,
+         unsafe_fast)
 
 
 @cli.command(short_help="Run in continous mode")
@@ -66,9 +98,25 @@ def single(hostname, port, source_db, destination_db, tablename,
               help="Hostname", show_default=True)
 @click.option('-p', '--port', required=True, default=5432, type=int,
               help="Port", show_default=True)
-@click.option('-c', '--chunksize', required=True, default=MAX_CHUNKSIZE,
-              type=int, help="Transaction chunk size".format(MAX_CHUNKSIZE),
+@click.option('-c', '--chunksize', required=True, default=DEFAULT_CHUNKSIZE,
+              type=int, help="Transaction chunk size",
+              callback=validate_chunk_size, show_default=True)
+@click.option('-m', '--target-chunk-mb', default=DEFAULT_TARGET_CHUNK_MB,
+              type=click.IntRange(1, None),
+              help="Approximate size of each chunk in MB, as stored by "
+                   "postgres, lowering chunksize for tables with wide rows. "
+                   "Once fetched, chunks take several times as much memory",
               show_default=True)
+@click.option('-j', '--parallelism', default=DEFAULT_PARALLELISM,
+              type=click.IntRange(1, None),
+              help="Number of slices to sync in parallel, for syncs large "
+                   "enough to make up for the extra processes. An "
+                   "interrupted parallel run resumes from the first slice it "
+                   "didn't finish", show_default="one per CPU, up to 8")
+@click.option('--unsafe-fast', is_flag=True,
+              help="Don't wait for each chunk to be flushed to disk on the "
+                   "destination db. If it crashes, the latest chunks may be "
+                   "lost and will be synced again on the next run")
 @click.option('-d', '--delay', default=5, type=int,
               help="Time in seconds to wait between executions",
               show_default=True)
@@ -78,7 +126,8 @@ def single(hostname, port, source_db, destination_db, tablename,
 @click.argument('username')
 @click.password_option()
 def continuous(hostname, port, source_db, destination_db, tablename,
-               username, password, chunksize, delay):
+               username, password, chunksize, target_chunk_mb, parallelism,
+               unsafe_fast, delay):
     """Continuous mode basically executes the same algorithm for single-time
     mode, but continuously repeating in order to keep the two tables in sync,
     waiting `delay` seconds between each run.
@@ -88,9 +137,12 @@ def continuous(hostname, port, source_db, destination_db, tablename,
         str(crayons.white('Starting continuous mode… ᕙ(⇀‸↼‶)ᕗ', bold=True)))
 
     try:
+        # keep the same session around for every run
+        session = None
         while True:
-            sync(hostname, port, source_db, destination_db, tablename,
-                 username, password, chunksize)
+            session = sync(hostname, port, source_db, destination_db,
+                           tablename, username, password, chunksize,
+                           target_chunk_mb, parallelism, unsafe_fast, session)
             time.sleep(delay)
     except (SystemExit, KeyboardInterrupt):
         # already handled by the sync method, just make sure we always exit
@@ -98,42 +150,64 @@ def continuous(hostname, port, source_db, destination_db, tablename,
 
 
 def sync(hostname, port, source_db, destination_db, tablename, username,
-         password, chunksize):
+         password, chunksize, target_chunk_mb, parallelism, unsafe_fast,
+         session=None):
+    """Runs a single sync with a pretty progress spinner, reusing `session`
+    if given. Returns the session used, so it can be passed to later runs.
+    """
+
     t0 = time.time()
     # colorize our spinner text
     spinner_text = str(crayons.green("{}…", bold=True))
     with create_spinner(text=spinner_text.format("Instancing")) as sp:
         try:
+            if session is None:
+                session = pypgsync.create_session(
+                    host=hostname,
+                    port=port,
+                    src_db=source_db,
+                    dst_db=destination_db,
+                    tbl=tablename,
+                    user=username,
+                    passwd=password,
+                    chunksize=chunksize,
+                    parallelism=parallelism,
+                    synchronous_commit=not unsafe_fast,
+                    target_chunk_bytes=target_chunk_mb * 1024 * 1024)
+
             # instance result iterator
-            result_iter = pypgsync.start_single(
-                host=hostname,
-                port=port,
-                src_db=source_db,
-                dst_db=destination_db,
-                tbl=tablename,
-                user=username,
-                passwd=password,
-                chunksize=chunksize)
+            result_iter = pypgsync.sync_session(session)
 
             total_rows = 0
+            last_update = 0.0
+            syncing_text = spinner_text.format("Syncing")
             # loop through result in chunks
             for r in result_iter:
                 total_rows = r[0]
-                # variables used to calculate progress and ETA
+                # only redraw the spinner every so often, terminal writes
+                # are expensive next to small chunks
                 t1 = time.time()
+                if t1 - last_update < SPINNER_UPDATE_INTERVAL:
+                    continue
+                last_update = t1
+
+                # variables used to calculate progress and ETA
+                # the total row count is estimated, never go over 100%
+                progress = min(r[0] / r[2], 1)
                 rows_per_sec = round(r[0] / (t1 - t0))
-                bar_length = int((r[2] - r[0]) / r[2] * 25)
-                bar_progress = int(r[0] / r[2] * 25)
-                eta = int((t1 - t0) / (r[0] / r[2]) - (t1 - t0))
+                bar_length = int((1 - progress) * 25)
+                bar_progress = int(progress * 25)
+                eta = int((t1 - t0) / progress - (t1 - t0))
 
                 # update our pretty spinner
-                sp.text = (spinner_text.format("Syncing") + " ({} rows/s) | {}% ["
+                sp.text = (syncing_text + " ({} rows/s) | {}% ["
                            + "#" * bar_progress + "-" * bar_length
                            + "] ETA: {}s").format(rows_per_sec,
-                                                  int(r[0] / r[2] * 100), eta)
+                                                  int(progress * 100), eta)
             sp.stop()
             click.secho("{} rows synced. No rows left to sync!（ ^_^）o自自o（^_^ ）".format(total_rows),
                         fg="green", bold=True)
+            return session
         except RuntimeError as e:
             sp.stop()
             click.secho('FATAL: {}'.format(e.args[0]), fg="red", bold=True)
@@ -3,16 +3,14 @@ import time
 from pypgsync.session import Session
 
 
-def start_single(host, port, src_db, dst_db, tbl, user, passwd, chunksize):
-    """API wrapper for Session in the form of a generator - purely spawns a
-    Session object, calls Session.merge_chunks() and yields each single
-    processed chunk in the form of rows processed and total rows.
+def create_session(host, port, src_db, dst_db, tbl, user, passwd, chunksize,
+                   parallelism=1, synchronous_commit=True,
+                   target_chunk_bytes=None):
+    """Spawns a Session object that can be passed to sync_session() for as
+    many runs as needed, without reconnecting or reflecting tables again.
     """
 
-    # execution time used for limiting current fetch
-    max_updated = int(time.time() * 1000)
-
-    session = Session(
+    return Session(
         host=host,
         port=port,
         src_db=src_db,
@@ -21,7 +19,37 @@ def start_single(host, port, src_db, dst_db, tbl, user, passwd, chunksize):
         user=user,
         passwd=passwd,
         chunksize=chunksize,
-        max_updated=max_updated)
+        parallelism=parallelism,
+        synchronous_commit=synchronous_commit,
+        target_chunk_bytes=target_chunk_bytes)
+
+
+def sync_session(session):
+    """Generator syncing data with an existing Session up until the current
+    time, yielding each single processed chunk in the form of rows processed
+    and total rows.
+    """
+
+    # execution time used for limiting current fetch
+    max_updated = int(time.time() * 1000)
+
+    session.refresh(max_updated)
 
     for r in session.merge_chunks():
         yield r
+
+
+def start_single(host, port, src_db, dst_db, tbl, user, passwd, chunksize,
+                 parallelism=1, synchronous_commit=True,
+                 target_chunk_bytes=None):
+    """API wrapper for Session in the form of a generator - purely spawns a
+    Session object, calls Session.merge_chunks() and yields each single
+    processed chunk in the form of rows processed and total rows.
+    """
+
+    session = create_session(host, port, src_db, dst_db, tbl, user, passwd,
+                             chunksize, parallelism, synchronous_commit,
+                             target_chunk_bytes)
+
+    for r in sync_session(session):
+        yield r
@@ -1,19 +1,40 @@
+import math
+import multiprocessing
 import re
+import psycopg2
 import sqlalchemy
 
-from contextlib import contextmanager
-from sqlalchemy import asc, select
-from sqlalchemy.sql import func, text
-from sqlalchemy.schema import MetaData, Table
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager
+from itertools import islice
+from queue import Empty
+from sqlalchemy import asc, bindparam, select, tablesample
+from sqlalchemy.sql import func, literal_column, text
+from sqlalchemy.schema import Column, MetaData, Table
+from sqlalchemy.types import BigInteger, Text
 from sqlalchemy.dialects import postgresql
-from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy import and_
 
+from psycopg2.extras import Json, execute_values
 
 from sqlalchemy_utils import database_exists
 
 
-from pypgsync.utils import attrs_to_uri, intervals
+from pypgsync.utils import (adapt_columns, attrs_to_uri, copy_buffer,
+                            copy_encoder, deduplicate, intervals, prefetch)
+
+# const: chunksize lower bound when fitting chunks to a size in bytes
+MIN_CHUNKSIZE = 100
+
+# const: minimum number of chunks per worker for a parallel run to be worth
+# spawning worker processes, connecting and reflecting tables all over again
+PARALLEL_MIN_CHUNKS = 10
+
+# const: destination db table remembering where each synced table has to be
+# resumed from, for as long as a parallel run may have left gaps behind
+CHECKPOINT_TABLE = Table('pypgsync_checkpoint', MetaData(),
+                         Column('table_name', Text, primary_key=True),
+                         Column('resume_from', BigInteger, nullable=False))
 
 
 class Session(object):
@@ -21,69 +42,299 @@ class Session(object):
     time.
     """
 
-    def __init__(self, host, port, src_db, dst_db, tbl, user, passwd, chunksize, max_updated):
+    def __init__(self, host, port, src_db, dst_db, tbl, user, passwd, chunksize, max_updated=None,
+                 parallelism=1, synchronous_commit=True, target_chunk_bytes=None):
         """Constructor for the Session class. Basically instantiate sqlalchemy
         engines for both sourceDB and destinationDB, fetch table metadata, and
         create destination table if necessary.
+
+        If `max_updated` is not given, Session.refresh() must be called before
+        merging chunks. If `target_chunk_bytes` is given, chunksize is lowered
+        as needed for chunks to stay around that size on disk.
         """
 
-        self.src_engine = self._engine(attrs_to_uri(
-            user, passwd, host, port, src_db))
-        self.dst_engine = self._engine(attrs_to_uri(
-            user, passwd, host, port, dst_db))
+        self.src_uri = attrs_to_uri(user, passwd, host, port, src_db)
+        self.dst_uri = attrs_to_uri(user, passwd, host, port, dst_db)
+        self.synchronous_commit = synchronous_commit
+        self.src_engine = self._engine(self.src_uri)
+        self.dst_engine = self._engine(self.dst_uri, synchronous_commit)
         self.table_name = tbl
         self.chunksize = chunksize
-        self.max_updated = max_updated
+        self.parallelism = parallelism
 
         self._init_db()
+        self._reflect_tables()
+        self._ensure_updated_index()
+        self._prepare_statements()
+
+        if target_chunk_bytes is not None:
+            self.chunksize = self._fit_chunksize(target_chunk_bytes)
+
+        if max_updated is not None:
+            self.refresh(max_updated)
+
+        super(Session, self).__init__()
+
+    def refresh(self, max_updated):
+        """Works out what is left to sync up until `max_updated`. This lets a
+        single Session, along with its engines and reflected tables, be reused
+        across several runs.
+        """
+
+        self.max_updated = max_updated
+        self.starting_point = self._get_starting_point()
+        self.slices, self.src_table_size = self.calculate_optimal_slices()
+
+    def __getstate__(self):
+        """Engines, metadata and tables can't be shared across processes, so
+        leave them out when pickling a Session for a worker process.
+        """
+
+        state = self.__dict__.copy()
+        for attr in ('src_engine', 'dst_engine', 'src_metadata',
+                     'dst_metadata', 'src_table', 'dst_table',
+                     'copy_encoders'):
+            del state[attr]
+
+        return state
+
+    def __setstate__(self, state):
+        """Rebuild engines, tables and statements left out by __getstate__."""
+
+        self.__dict__.update(state)
+
+        self.src_engine = self._engine(self.src_uri)
+        self.dst_engine = self._engine(self.dst_uri, self.synchronous_commit)
+        self.src_metadata = MetaData(self.src_engine)
+        self.dst_metadata = MetaData(self.dst_engine)
+
+        self._reflect_tables()
+        self._prepare_statements()
+
+    def _reflect_tables(self):
+        """Load source and destination table definitions."""
 
         self.src_table = Table(self.table_name, self.src_metadata,
                                autoload=True)
         self.dst_table = Table(self.table_name, self.dst_metadata,
                                autoload=True)
 
-        self.starting_point = self._get_starting_point()
-        self.slices, self.src_table_size = self.calculate_optimal_slices()
+    def _ensure_updated_index(self):
+        """Makes sure the destination table has an index on the `updated`
+        column, so looking up our starting point doesn't take a full table
+        scan on every run. The source table is left alone, as we only expect
+        read access to it.
+        """
 
-        super(Session, self).__init__()
+        indexes = sqlalchemy.inspect(self.dst_engine) \
+            .get_indexes(self.table_name)
+
+        if any(i['column_names'][:1] == ['updated'] for i in indexes):
+            return
+
+        preparer = self.dst_engine.dialect.identifier_preparer
+
+        # the destination table may already be large and in use, build the
+        # index without locking out writes to it. this can't be done inside a
+        # transaction. leaving the name out lets postgres pick a free one
+        stmt = text('CREATE INDEX CONCURRENTLY ON {} ({})'.format(
+            preparer.format_table(self.dst_table), preparer.quote('updated')))
+
+        try:
+            with self.dst_engine.connect() as dst:
+                dst.execution_options(isolation_level='AUTOCOMMIT') \
+                    .execute(stmt)
+        except sqlalchemy.exc.DBAPIError:
+            # e.g. we don't own the table. the index only speeds up looking
+            # up our starting point, so carry on without it
+            pass
+
+    def _prepare_statements(self):
+        """Build the statements used for merging chunks up front, so they are
+        not rebuilt and recompiled for every slice and window.
+        """
+
+        # names of the columns both tables have in common, in the same order
+        # they come out of the source table. anything else would only be
+        # fetched to be thrown away
+        self.column_names = tuple(c for c in self.src_table.columns.keys()
+                                  if c in self.dst_table.columns)
+
+        # positions of the destination's primary key within self.column_names
+        self.primary_key_idx = tuple(
+            i for i, c in enumerate(self.column_names)
+            if self.dst_table.c[c].primary_key)
+
+        # positions of json columns within self.column_names. psycopg2 can't
+        # tell json values apart from other dicts and lists on its own
+        self.json_idx = tuple(
+            i for i, c in enumerate(self.column_names)
+            if isinstance(self.dst_table.c[c].type, sqlalchemy.types.JSON))
+
+        # select statement for a single window of a slice.
+        # this order-by makes sure we will upsert in the correct order
+        select_stmt = \
+            select([self.src_table.c[c] for c in self.column_names]) \
+            .where(
+                and_(self.src_table.c.updated >= bindparam('window_start'),
+                     self.src_table.c.updated <= bindparam('window_end'))
+            ) \
+            .order_by(asc(self.src_table.c.updated))
+
+        # compiled only once, to be run straight through psycopg2
+        self.select_sql = str(
+            select_stmt.compile(dialect=self.src_engine.dialect))
+
+        self.upsert_sql = self._upsert_sql()
+        self.copy_sql = self._copy_sql()
+        self.copy_encoders = self._copy_encoders()
+
+    def _fit_chunksize(self, target_chunk_bytes):
+        """Estimates the average row size from a sample of the source table,
+        and returns the chunksize that keeps chunks within
+        `target_chunk_bytes`, without going over the current chunksize or
+        under MIN_CHUNKSIZE.
+
+        Row sizes are measured the way postgres stores them, possibly
+        compressed, so the same rows take several times as much memory once
+        fetched into Python objects.
+        """
+
+        # sampling 1% of the table's pages is cheap on large tables, but
+        # tables spanning few pages, such as those with wide rows stored out
+        # of line, often get no rows out of it. those are small enough to
+        # just read their first rows instead
+        sources = (tablesample(self.src_table, func.system(1)),
+                   self.src_table)
+
+        with self.connect() as (src, dst):
+            for source in sources:
+                sample = select([source.c[c] for c in self.column_names]) \
+                    .limit(1000) \
+                    .alias('t')
+
+                row_size = src.execute(
+                    select([func.avg(
+                        func.pg_column_size(literal_column('t')))])
+                    .select_from(sample)).scalar()
+
+                if row_size:
+                    break
+
+        if not row_size:
+            # the table is empty, there is nothing to fit chunks to
+            return self.chunksize
+
+        return min(self.chunksize,
+                   max(MIN_CHUNKSIZE, int(target_chunk_bytes // row_size)))
 
     def _get_starting_point(self):
         """This method basically gets the MAX(updated) from the destination
         table. This will serve as a starting point for us, in the case we are
         not on our first run of the sync operation, and some rows have already
         been migrated to the destination table.
+
+        If a parallel run was interrupted, its checkpoint is used instead, as
+        rows past it may have been synced while older ones were not.
         """
 
         with self.connect() as (src, dst):
             stmt = select([func.max(self.dst_table.c.updated)])
             min = dst.execute(stmt).scalar()
 
+            # an empty destination table can't have any conflicting rows, so
+            # we are free to bulk load it with COPY instead of upserting
+            self.initial_load = not min
+
+            self.checkpoint = self._load_checkpoint(dst)
+            if self.checkpoint is not None:
+                return self.checkpoint
+
             if not min:
                 stmt = select([func.min(self.src_table.c.updated)])
                 min = src.execute(stmt).scalar()
 
             return min
 
+    def _load_checkpoint(self, dst):
+        """Returns where an interrupted parallel run left off for this table,
+        or None if there is nothing to resume.
+        """
+
+        if not self.dst_engine.has_table(CHECKPOINT_TABLE.name):
+            return None
+
+        return dst.execute(
+            select([CHECKPOINT_TABLE.c.resume_from])
+            .where(CHECKPOINT_TABLE.c.table_name == self.table_name)).scalar()
+
+    def _save_checkpoint(self, resume_from):
+        """Records that every row before `resume_from` is synced, in case the
+        current parallel run doesn't make it to the end.
+        """
+
+        CHECKPOINT_TABLE.create(self.dst_engine, checkfirst=True)
+
+        stmt = postgresql.insert(CHECKPOINT_TABLE) \
+            .values(table_name=self.table_name, resume_from=resume_from)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[CHECKPOINT_TABLE.c.table_name],
+            set_={'resume_from': stmt.excluded.resume_from})
+
+        with self.dst_engine.begin() as dst:
+            dst.execute(stmt)
+
+    def _clear_checkpoint(self):
+        """Forgets the checkpoint once the table is synced without gaps."""
+
+        with self.dst_engine.begin() as dst:
+            dst.execute(CHECKPOINT_TABLE.delete()
+                        .where(CHECKPOINT_TABLE.c.table_name
+                               == self.table_name))
+
     @classmethod
-    def _chunkify(self, conn, statement, column, chunksize):
+    def _chunkify(self, conn, sql, start, end, windows, chunksize):
         """This creates a generator yielding data chunks of size chunkSize.
-        Expects result to be a sqlalchemy ResultProxy object.
+
+        The raw `sql` is executed once for each of `windows` equally-sized
+        ranges between `start` and `end`, passed as its `window_start` and
+        `window_end` parameters, so the server only ever has to sort one
+        window at a time. Rather than scanning the table for exact window
+        boundaries, this relies on the row count estimate already used for
+        slicing, so windows are only as even as the data is distributed.
         """
 
-        for window, len in self.windowed_query(conn, statement, column, chunksize):
-            try:
-                result = conn.execute(window)
+        window_length = max(1, (end - start + 1) / windows)
 
-                yield result.fetchall(), len
-            finally:
-                # close resultset instead of relying on garbage collection
-                # in the event of an exception
-                result.close()
+        for window_start, window_end in intervals(start, end, window_length):
+            # read the window through a psycopg2 server-side cursor, which
+            # takes a single FETCH FORWARD round trip per chunk, and never
+            # holds more than one chunk of an uneven window at once. the
+            # cursor is closed even if we don't make it to the end
+            with conn.connection.cursor(name='pypgsync_window') as cursor:
+                cursor.execute(sql, {'window_start': window_start,
+                                     'window_end': window_end})
+
+                while True:
+                    chunk = cursor.fetchmany(chunksize)
+                    if not chunk:
+                        break
+
+                    yield chunk
 
     @classmethod
-    def _engine(self, db_uri):
-        # use batch mode for more efficient batch inserts
-        return sqlalchemy.create_engine(db_uri, use_batch_mode=True)
+    def _engine(self, db_uri, synchronous_commit=True):
+        connect_args = {}
+        if not synchronous_commit:
+            # don't wait for the WAL to be flushed to disk on every commit
+            connect_args['options'] = '-c synchronous_commit=off'
+
+        # we only ever use one connection at a time per db, keep it around
+        # and make sure it's still alive before handing it out
+        return sqlalchemy.create_engine(db_uri, pool_size=1,
+                                        pool_pre_ping=True,
+                                        pool_recycle=3600,
+                                        connect_args=connect_args)
 
     @contextmanager
     def connect(self):
@@ -100,64 +351,225 @@ class Session(object):
         Returns a tuple of (source_connection, destination_connection)
         """
 
-        conn = self.src_engine.connect(), self.dst_engine.connect()
-
-        try:
-            yield conn
-        finally:
-            # close both connections
-            (c.close() for c in conn)
+        # the exit stack closes both connections once we're done, even if
+        # connecting to the destination db fails
+        with ExitStack() as stack:
+            yield (stack.enter_context(self.src_engine.connect()),
+                   stack.enter_context(self.dst_engine.connect()))
 
     def merge_chunks(self):
-        """For each slice in self.slices, spawn two connections to source and
-        destination DBs, build the upsert statement, and then for each chunk,
-        execute the upsert statement, yielding current progress and total
-        number of rows to be processed.
+        """Merge every slice in self.slices into the destination table, either
+        one after the other or spread over `parallelism` worker processes,
+        yielding current progress and total number of rows to be processed.
         """
 
         # progress counter
         processed_rowcount = 0
 
-        for slice in self.slices:
-            # spawns connection via contextmanager so it gracefully closes once
-            # we're done
-            with self.connect() as (src, dst):
-                # build the select statement
-                # this order-by makes sure we will upsert in the correct order
-                select_stmt = \
-                    select([self.src_table]) \
-                    .where(
-                        and_(self.src_table.c.updated >= slice[0],
-                             self.src_table.c.updated <= slice[1])
-                    ) \
-                    .order_by(asc(self.src_table.c.updated))
-
-                insert_stmt = insert(self.dst_table)
-
-                # dict with non-primary key columns
-                update_cols = {
-                    c.name: c for c in insert_stmt.excluded if not c.primary_key}
-
-                # upsert statement on primary key conflicts
-                insert_stmt = insert_stmt.on_conflict_do_update(
-                    constraint=self.dst_table.primary_key,
-                    set_=update_cols)
-
-                # walk the resultset and perform inserts incrementally, in chunks
-                for chunk, rowcount in self._chunkify(src, select_stmt, self.src_table.c.updated, self.chunksize):
-                    # execute the upsert statement as execute_batch
-                    dst.execute(
-                        insert_stmt, [dict(zip(self.src_table.columns.keys(), r))
-                                      for r in chunk])
-
-                    # increment our progress counter
-                    processed_rowcount += len(chunk)
-
-                    # yield current progress and total.
-                    # when using psycopg2 in batch mode, we can't know the
-                    # executed statement's rowcount, so make sure we don't
-                    # increment over the total number of rows.
-                    yield min(processed_rowcount, rowcount), rowcount, self.src_table_size
+        if self._parallel(self.src_table_size) and len(self.slices) > 1:
+            progress = self._merge_slices_parallel()
+        else:
+            progress = self.merge_slices(self.slices)
+
+        for rows, rowcount in progress:
+            # increment our progress counter
+            processed_rowcount += rows
+
+            # yield current progress and total.
+            # both the slice and table totals are estimates, so the
+            # number of processed rows may end up going over them.
+            yield processed_rowcount, rowcount, self.src_table_size
+
+        # everything up until max_updated is synced now, so MAX(updated) from
+        # the destination table can be trusted again
+        if self.checkpoint is not None:
+            self._clear_checkpoint()
+            self.checkpoint = None
+
+    def _parallel(self, rowcount):
+        """Whether merging `rowcount` rows is worth spreading over
+        `parallelism` worker processes. Smaller syncs, like most runs in
+        continuous mode, are quicker merged right away on the connections
+        we already have.
+        """
+
+        return self.parallelism > 1 and \
+            rowcount >= PARALLEL_MIN_CHUNKS * self.chunksize * self.parallelism
+
+    def _merge_slices_parallel(self):
+        """Runs merge_slices for every slice in self.slices on a pool of
+        `parallelism` worker processes, yielding progress from all of them as
+        it comes in.
+
+        Slices finish out of order, so a checkpoint on the destination db
+        keeps track of the first slice that isn't done yet. If a slice fails,
+        no other slice is started, and the next run resumes from there.
+        """
+
+        # slices that are not done yet, in order
+        unfinished = list(self.slices)
+        self.checkpoint = unfinished[0][0]
+        self._save_checkpoint(self.checkpoint)
+
+        with multiprocessing.Manager() as manager, \
+                ProcessPoolExecutor(max_workers=self.parallelism) as executor:
+            queue = manager.Queue()
+            queued = iter(self.slices)
+            pending = {}
+
+            try:
+                while True:
+                    # only hand a slice over once a worker is free for it,
+                    # so no new slice gets started after one fails. the
+                    # executor can't take back slices it already queued up
+                    for slice in islice(queued,
+                                        self.parallelism - len(pending)):
+                        future = executor.submit(_merge_slice_worker, self,
+                                                 slice, queue)
+                        pending[future] = slice
+
+                    if not pending:
+                        break
+
+                    try:
+                        yield queue.get(timeout=0.1)
+                    except Empty:
+                        pass
+
+                    done = [f for f in pending if f.done()]
+                    for future in done:
+                        # re-raise any exception from the worker
+                        future.result()
+                        unfinished.remove(pending.pop(future))
+
+                    if done and unfinished \
+                            and unfinished[0][0] != self.checkpoint:
+                        self.checkpoint = unfinished[0][0]
+                        self._save_checkpoint(self.checkpoint)
+            finally:
+                # leaving the executor waits for every submitted slice, so
+                # cancel those not started yet if we are stopping early.
+                # slices already running are left to finish on their own
+                for future in pending:
+                    future.cancel()
+
+            # workers are done, drain whatever progress is left
+            while not queue.empty():
+                yield queue.get()
+
+    def merge_slices(self, slices):
+        """Spawn two connections to source and destination DBs, and then for
+        each chunk in each of the given slices, execute the upsert statement,
+        yielding the number of rows in each chunk and the estimated number of
+        rows in its slice.
+        """
+
+        # keep loading rows with COPY for as long as the destination table
+        # was empty and no conflicts came up, as long as we know how to write
+        # every column in COPY format
+        bulk_load = self.initial_load and self.copy_encoders is not None
+
+        # spawns connection via contextmanager so it gracefully closes once
+        # we're done. the same connections are used for all slices
+        with self.connect() as (src, dst):
+            for slice in slices:
+                # approximate number of rows in this slice, assuming `updated`
+                # is evenly distributed
+                rowcount = int(self.src_table_size * (slice[1] - slice[0] + 1)
+                               / (self.slices[-1][1] - self.starting_point + 1))
+
+                # walk the resultset and perform inserts incrementally, in
+                # chunks. the next chunk is fetched from the source while the
+                # current one is written to the destination, so up to three
+                # chunks are held in memory at once: the one being written,
+                # one waiting in line and the one being fetched
+                for chunk in prefetch(self._chunkify(
+                        src, self.select_sql, slice[0], slice[1],
+                        max(1, math.ceil(rowcount / self.chunksize)),
+                        self.chunksize)):
+                    if bulk_load:
+                        try:
+                            with dst.begin(), dst.connection.cursor() as cursor:
+                                cursor.copy_expert(
+                                    self.copy_sql,
+                                    copy_buffer(chunk, self.copy_encoders))
+                        except (psycopg2.IntegrityError, psycopg2.DataError):
+                            # either some rows already made it to the
+                            # destination table or COPY couldn't handle one
+                            # of the values, fall back to upserting from now on
+                            bulk_load = False
+
+                    if not bulk_load:
+                        # execute the upsert statement via psycopg2's
+                        # execute_values, which packs the whole chunk into a
+                        # single multi-row INSERT instead of one per row
+                        with dst.begin(), dst.connection.cursor() as cursor:
+                            # rows are passed through as plain sequences,
+                            # matching the order of self.column_names.
+                            # a single upsert can't touch the same row twice,
+                            # so only the latest version of each row is sent
+                            rows = deduplicate(chunk, self.primary_key_idx)
+                            execute_values(cursor, self.upsert_sql,
+                                           adapt_columns(rows, self.json_idx,
+                                                         Json),
+                                           page_size=self.chunksize)
+
+                    yield len(chunk), rowcount
+
+    def _upsert_sql(self):
+        """Builds a raw `INSERT ... ON CONFLICT DO UPDATE` statement against
+        the destination table, to be used with psycopg2's execute_values.
+        """
+
+        preparer = self.dst_engine.dialect.identifier_preparer
+        quote = preparer.quote
+        columns = self.column_names
+        primary_key = [c.name for c in self.dst_table.primary_key.columns]
+
+        # non-primary key columns are overwritten on primary key conflicts,
+        # unless the destination row is newer: slices merged in parallel may
+        # reach the same row out of order
+        update_cols = ', '.join(
+            '{0} = EXCLUDED.{0}'.format(quote(c))
+            for c in columns if c not in primary_key)
+        on_conflict = 'DO UPDATE SET {} WHERE dst.{updated} <= EXCLUDED.{updated}' \
+            .format(update_cols, updated=quote('updated')) \
+            if update_cols else 'DO NOTHING'
+
+        statement = 'INSERT INTO {} AS dst ({}) VALUES %s ' \
+            'ON CONFLICT ({}) {}'.format(
+                preparer.format_table(self.dst_table),
+                ', '.join(quote(c) for c in columns),
+                ', '.join(quote(c) for c in primary_key),
+                on_conflict)
+
+        return statement
+
+    def _copy_sql(self):
+        """Builds a raw `COPY ... FROM STDIN` statement against the
+        destination table, to be used with psycopg2's copy_expert.
+        """
+
+        preparer = self.dst_engine.dialect.identifier_preparer
+
+        return 'COPY {} ({}) FROM STDIN'.format(
+            preparer.format_table(self.dst_table),
+            ', '.join(preparer.quote(c) for c in self.column_names))
+
+    def _copy_encoders(self):
+        """Picks how each column is written with COPY, going by its type on
+        the destination table.
+
+        Returns None if any of the columns has a type we can't safely write
+        with COPY, in which case the table is always upserted.
+        """
+
+        encoders = [copy_encoder(self.dst_table.c[c].type)
+                    for c in self.column_names]
+
+        if any(e is None for e in encoders):
+            return None
+        return encoders
 
     def _init_db(self):
         """Checks if both databases and tables exists. If destination table
@@ -180,18 +592,16 @@ class Session(object):
                 raise RuntimeError(
                     'Database unreachable ¯\_(⊙︿⊙)_/¯')
 
-        # get metadata for both dbs
-        self.src_metadata = MetaData(self.src_engine, reflect=True)
-        self.dst_metadata = MetaData(self.dst_engine, reflect=True)
+        # metadata for both dbs, only the table we sync gets reflected
+        self.src_metadata = MetaData(self.src_engine)
+        self.dst_metadata = MetaData(self.dst_engine)
 
-        if self.table_name not in self.src_metadata.tables:
-            import pdb
-            pdb.set_trace()
+        if not self.src_engine.has_table(self.table_name):
             raise RuntimeError(
                 'Table "{}" does not exist in source db ¯\_(ツ)_/¯'
                 .format(self.table_name))
 
-        if self.table_name not in self.dst_metadata.tables:
+        if not self.dst_engine.has_table(self.table_name):
             # create table in destination db if it doesn't exist
             tbl = Table(self.table_name, self.src_metadata, autoload=True)
             tbl.metadata.create_all(self.dst_engine)
@@ -233,76 +643,30 @@ class Session(object):
             # extract rowcount from explain result
             m = int(re.search('rows=([0-9]*)', result).groups()[0])
 
-            # ideal length for each interval so that eaach slice has 10m rows
-            slice_length = (self.max_updated
-                            - self.starting_point) / m * 10_000_000
+            rows_per_slice = 10_000_000
+            if self._parallel(m):
+                # make sure every worker gets at least one slice to work on
+                rows_per_slice = min(rows_per_slice,
+                                     math.ceil(m / self.parallelism))
 
-            return list(intervals(self.starting_point, self.max_updated, slice_length)), m
+            # no need to slice past the newest row we know of, anything newer
+            # will be picked up on the next run
+            end = min(src_max, self.max_updated)
 
-    @classmethod
-    def windowed_query(self, conn, select_stmt, column, windowsize):
-        """Generator that yields filter ranges against a given column that break
-        it into windows.
-
-        Initially executes something like this:
-            SELECT column
-            FROM
-                (SELECT column, ROW_NUMBER() OVER (ORDER BY column) as rownum
-                 FROM column.Table) as subquery
-            WHERE subquery.rownum % windowsize = 1;
-
-        With the result from that, yield select statements using the values
-        returned against select_stmt.
+            # ideal length for each interval so that eaach slice has 10m rows
+            slice_length = (end - self.starting_point) / m * rows_per_slice
 
-        It's important to do this so we don't force the server to load the entire
-        resultset into memory before we even start fetching chunks.
+            return list(intervals(self.starting_point, end, slice_length)), m
 
-        Adapted from https://github.com/sqlalchemy/sqlalchemy/wiki/WindowedRangeQuery
 
-        """
+def _merge_slice_worker(session, slice, queue):
+    """Entry point for worker processes: merges a single slice, pushing its
+    progress back to the parent process through `queue`.
+    """
 
-        def interval_to_expr(start, end):
-            if end:
-                return and_(
-                    column >= start,
-                    column < end
-                )
-            else:
-                return column >= start
-
-        stmt = \
-            select([
-                column,
-                func.row_number()
-                    .over(order_by=column)
-                    .label('rownum')
-            ])
-
-        # apply where clauses from original select_stmt
-        stmt._whereclause = select_stmt._whereclause
-
-        # turn this into a subquery
-        stmt = stmt.alias('anon_1')
-
-        # select from subquery
-        q = select([getattr(stmt.c, column.name)])
-
-        if windowsize > 1:
-            # apply modulo windowsize to determine all starting points
-            q = q.where(sqlalchemy.text("rownum %% %d=1" % windowsize))
-
-        # execute query
-        windows = [n for n in conn.execute(q).fetchall()]
-
-        # this rowcount will be innacurate with very large window sizes
-        rowcount = len(windows) * windowsize
-
-        while windows:
-            # yield all windows in ascending order
-            start = windows.pop(0)[0]
-            if windows:
-                end = windows[0][0]
-            else:
-                end = None
-            # feed back the approximate total result size so we can calculate progress
-            yield select_stmt.where(interval_to_expr(start, end)), rowcount
+    try:
+        for progress in session.merge_slices([slice]):
+            queue.put(progress)
+    finally:
+        session.src_engine.dispose()
+        session.dst_engine.dispose()
@@ -1,6 +1,23 @@
+import io
+import json
+import math
+import threading
+
 from contextlib import contextmanager
+from operator import itemgetter
+from queue import Full, Queue
+from sqlalchemy import types
+from sqlalchemy.dialects import postgresql
 from vistir import spin
 
+# const: characters that need escaping in PostgreSQL's COPY text format
+COPY_ESCAPES = str.maketrans(
+    {'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+# const: column types whose values are written to COPY as plain str()
+COPY_STR_TYPES = (types.String, types.Integer, types.Numeric, types.Boolean,
+                  types.Date, types.DateTime, types.Time, postgresql.UUID)
+
 
 def attrs_to_uri(user, passwd, host, port, db):
     """Receives db parameters and converts them into a sqlalchemy resource URI.
@@ -27,12 +44,158 @@ def create_spinner(text):
 
 
 def intervals(start, end, n):
-    """Yield successive n-sized interval pairs from start to end."""
+    """Return an iterator of successive n-sized interval pairs from start to
+    end.
+    """
     if start > end:
         raise ValueError("start must be smaller or equal to end!")
-    r = start
-    while True:
-        r += n
-        if r > end + n:
-            break
-        yield (int(r - n), int(min(r - 1, end)))
+    # intervals are integer ranges, so they can't be shorter than 1
+    n = max(n, 1)
+    # derive every boundary from its index rather than accumulating n, so
+    # floating point errors can't leave gaps between intervals
+    starts = [int(start) + int(i * n)
+              for i in range(math.ceil((end - start + 1) / n))]
+    ends = [s - 1 for s in starts[1:]]
+    ends.append(int(end))
+    return zip(starts, ends)
+
+
+def copy_encoder(sql_type):
+    """Picks how values of a column of the given sqlalchemy type are written
+    in PostgreSQL's COPY text format.
+
+    Returns a function turning non-null values into text, or None if values of
+    that type can't be told apart from their Python repr, so they are better
+    left to psycopg2 instead.
+    """
+
+    if isinstance(sql_type, types.ARRAY):
+        item_encoder = copy_encoder(sql_type.item_type)
+        if item_encoder is None:
+            return None
+
+        def encode_array(value):
+            if value is None:
+                return 'NULL'
+            if isinstance(value, list):
+                return '{' + ','.join(map(encode_array, value)) + '}'
+            return '"' + item_encoder(value).replace('\\', '\\\\') \
+                .replace('"', '\\"') + '"'
+
+        return encode_array
+    if isinstance(sql_type, types.JSON):
+        return json.dumps
+    if isinstance(sql_type, types.LargeBinary):
+        return lambda value: '\\x' + bytes(value).hex()
+    if isinstance(sql_type, COPY_STR_TYPES):
+        return str
+    return None
+
+
+def copy_buffer(rows, encoders=None):
+    """Serializes rows into PostgreSQL's COPY text format, passing each
+    non-null value through the function at the same position in `encoders`
+    (see copy_encoder). Values are passed to str() if no encoders are given.
+
+    Returns a file-like object ready to be consumed by COPY ... FROM STDIN.
+    """
+
+    def to_text(encoder, value):
+        if value is None:
+            return '\\N'
+        return encoder(value).translate(COPY_ESCAPES)
+
+    if rows and encoders is None:
+        encoders = [str] * len(rows[0])
+
+    return io.StringIO(
+        ''.join('\t'.join(map(to_text, encoders, r)) + '\n' for r in rows))
+
+
+def adapt_columns(rows, idx, adapter):
+    """Passes the non-null values at the `idx` indexes of each row through
+    `adapter`.
+
+    Returns rows untouched if there are no indexes to adapt.
+    """
+
+    if not idx:
+        return rows
+
+    idx = frozenset(idx)
+    return [tuple(adapter(v) if i in idx and v is not None else v
+                  for i, v in enumerate(r))
+            for r in rows]
+
+
+def deduplicate(rows, key):
+    """Drops rows sharing the same values at the `key` indexes, keeping the
+    last one of each.
+
+    Returns rows untouched if there were no duplicates.
+    """
+
+    if not key:
+        return rows
+
+    get_key = itemgetter(*key)
+    unique = {get_key(r): r for r in rows}
+
+    if len(unique) == len(rows):
+        return rows
+    return list(unique.values())
+
+
+def prefetch(iterable, size=1):
+    """Consumes iterable on a background thread, keeping up to `size` items
+    ready ahead of the caller, who gets them in order. This way, whatever
+    the caller does with each item overlaps with fetching the next ones.
+
+    Up to `size` + 2 items are alive at once: the one the caller is working
+    on, those waiting in line and the one being produced.
+
+    Exceptions raised by the iterable are re-raised to the caller.
+    """
+
+    queue = Queue(maxsize=size)
+    stop = threading.Event()
+    end = object()
+
+    def put(item):
+        # give up as soon as the caller goes away
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def produce():
+        it = iter(iterable)
+        try:
+            for item in it:
+                if not put((item, None)):
+                    return
+            put((end, None))
+        except Exception as e:
+            put((end, e))
+        finally:
+            # close generators from the thread that ran them
+            if hasattr(it, 'close'):
+                it.close()
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            item, error = queue.get()
+            if item is end:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
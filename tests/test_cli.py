@@ -0,0 +1,18 @@
+import click
+import pytest
+
+from pypgsync.cli import MAX_CHUNKSIZE, validate_chunk_size
+
+
+def test_validate_chunk_size_with_valid_input():
+    """Test behavior of validate_chunk_size method when receiving valid input."""
+    assert validate_chunk_size(None, None, 1) == 1
+    assert validate_chunk_size(None, None, MAX_CHUNKSIZE) == MAX_CHUNKSIZE
+
+
+def test_validate_chunk_size_with_invalid_input():
+    """Test behavior of validate_chunk_size method when receiving invalid input."""
+    with pytest.raises(click.BadParameter):
+        validate_chunk_size(None, None, 0)
+    with pytest.raises(click.BadParameter):
+        validate_chunk_size(None, None, MAX_CHUNKSIZE + 1)
@@ -0,0 +1,122 @@
+import os
+import time
+
+import pytest
+
+from types import SimpleNamespace
+from sqlalchemy import create_engine
+from sqlalchemy.schema import Column, MetaData, Table
+from sqlalchemy.types import BigInteger, Integer, Text
+
+from pypgsync.session import Session
+
+
+class FakeEngine(object):
+    """Stand-in for a sqlalchemy engine, as disposed of by worker processes."""
+
+    def dispose(self):
+        pass
+
+
+class FakeSession(object):
+    """Picklable stand-in for a Session, failing to merge one of its slices
+    and leaving a file behind in `marker_dir` for every slice it merges.
+    """
+
+    def __init__(self, slices, failing_slice, marker_dir, parallelism):
+        self.slices = slices
+        self.failing_slice = failing_slice
+        self.marker_dir = str(marker_dir)
+        self.parallelism = parallelism
+        self.src_engine = self.dst_engine = FakeEngine()
+        self.checkpoints = []
+
+    def merge_slices(self, slices):
+        for slice in slices:
+            if slice == self.failing_slice:
+                raise RuntimeError('Failed to merge slice')
+
+            time.sleep(0.2)
+            open(os.path.join(self.marker_dir, str(slice[0])), 'w').close()
+            yield 1, 1
+
+    def _save_checkpoint(self, resume_from):
+        self.checkpoints.append(resume_from)
+
+
+@pytest.mark.parametrize('parallelism,failing', [(1, 0), (1, 2), (3, 0),
+                                                 (3, 4)])
+def test_merge_slices_parallel_with_failing_slice(tmp_path, parallelism,
+                                                  failing):
+    """Test behavior of Session._merge_slices_parallel when one of the slices
+    fails to merge.
+    """
+    slices = [(i * 10, i * 10 + 9) for i in range(8)]
+    session = FakeSession(slices, slices[failing], tmp_path, parallelism)
+
+    with pytest.raises(RuntimeError):
+        list(Session._merge_slices_parallel(session))
+
+    merged = {int(f) for f in os.listdir(str(tmp_path))}
+    # slices handed out before the failing one are left to finish, but no
+    # slice is started after it fails
+    assert {s[0] for s in slices[:failing]} <= merged
+    assert merged <= {s[0] for s in slices[:failing + parallelism]}
+    # the next run resumes from the failing slice at the latest
+    assert session.checkpoints[-1] <= slices[failing][0]
+
+
+def test_parallel():
+    """Test behavior of Session._parallel when receiving valid input."""
+    session = SimpleNamespace(parallelism=4, chunksize=1000)
+    assert Session._parallel(session, 40000)
+    assert not Session._parallel(session, 39999)
+
+    session.parallelism = 1
+    assert not Session._parallel(session, 10 ** 9)
+
+
+def fake_statement_session(table):
+    """Stand-in for a Session holding just what is needed to build its
+    merge statements against `table`.
+    """
+    return SimpleNamespace(dst_engine=create_engine('postgresql://'),
+                           dst_table=table, column_names=tuple(table.c.keys()))
+
+
+def test_upsert_sql():
+    """Test behavior of Session._upsert_sql when receiving valid input."""
+    table = Table('Tbl', MetaData(),
+                  Column('id', Integer, primary_key=True),
+                  Column('Value', Text),
+                  Column('updated', BigInteger))
+
+    # rows are only overwritten with versions that aren't older than them
+    assert Session._upsert_sql(fake_statement_session(table)) == \
+        'INSERT INTO "Tbl" AS dst (id, "Value", updated) VALUES %s ' \
+        'ON CONFLICT (id) DO UPDATE SET "Value" = EXCLUDED."Value", ' \
+        'updated = EXCLUDED.updated WHERE dst.updated <= EXCLUDED.updated'
+
+
+def test_upsert_sql_with_primary_key_only():
+    """Test behavior of Session._upsert_sql when every column is part of the
+    primary key.
+    """
+    table = Table('tbl', MetaData(),
+                  Column('id', Integer, primary_key=True),
+                  Column('updated', BigInteger, primary_key=True))
+
+    assert Session._upsert_sql(fake_statement_session(table)) == \
+        'INSERT INTO tbl AS dst (id, updated) VALUES %s ' \
+        'ON CONFLICT (id, updated) DO NOTHING'
+
+
+def test_copy_sql():
+    """Test behavior of Session._copy_sql when receiving valid input."""
+    table = Table('Tbl', MetaData(),
+                  Column('id', Integer, primary_key=True),
+                  Column('Value', Text),
+                  Column('updated', BigInteger))
+
+    assert Session._copy_sql(fake_statement_session(table)) == \
+        'COPY "Tbl" (id, "Value", updated) FROM STDIN'
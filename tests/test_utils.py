@@ -1,6 +1,10 @@
 import pytest
 
-from pypgsync.utils import attrs_to_uri, intervals
+from sqlalchemy import types
+from sqlalchemy.dialects import postgresql
+
+from pypgsync.utils import (adapt_columns, attrs_to_uri, copy_buffer,
+                            copy_encoder, deduplicate, intervals, prefetch)
 
 
 def test_attrs_to_uri_with_valid_input():
@@ -15,12 +19,71 @@ def test_attrs_to_uri_with_invalid_input():
         attrs_to_uri('', 'passwd', 'host', 'port', 'db')
 
 
-def test_intervals():
+def test_intervals_with_valid_input():
     """Test behavior of intervals method when receiving valid input."""
     assert list(intervals(1, 1, 5)) == [(1, 1)]
     assert list(intervals(1, 10, 5)) == [(1, 5), (6, 10)]
+    assert list(intervals(0, 10, 2.5)) == [(0, 1), (2, 4), (5, 6), (7, 9),
+                                           (10, 10)]
 
-def test_intervals():
-    """Test behavior of intervals method when receiving valid input."""
+def test_intervals_with_invalid_input():
+    """Test behavior of intervals method when receiving invalid input."""
     with pytest.raises(ValueError):
         list(intervals(10, 1, 5))
+
+
+def test_copy_buffer():
+    """Test behavior of copy_buffer method when receiving valid input."""
+    assert copy_buffer([(1, 'a'), (2, None)]).read() == '1\ta\n2\t\\N\n'
+    assert copy_buffer([('a\tb\\c\nd',)]).read() == 'a\\tb\\\\c\\nd\n'
+
+    encoders = [copy_encoder(t) for t in (
+        postgresql.BYTEA(), postgresql.JSONB(),
+        postgresql.ARRAY(types.Text()))]
+    row = (memoryview(b'\x00\xff'), {'a': [1, '2']}, ['x', None, 'y"z\\'])
+    assert copy_buffer([row], encoders).read() == \
+        '\\\\x00ff\t{"a": [1, "2"]}\t{"x",NULL,"y\\\\"z\\\\\\\\"}\n'
+    # a json string must not be confused with a bare json value
+    assert copy_buffer([('1',)], [copy_encoder(types.JSON())]).read() == \
+        '"1"\n'
+
+
+def test_copy_encoder_with_unsupported_types():
+    """Test behavior of copy_encoder method when receiving column types it
+    can't encode.
+    """
+    assert copy_encoder(postgresql.INTERVAL()) is None
+    assert copy_encoder(postgresql.ARRAY(postgresql.INTERVAL())) is None
+
+
+def test_adapt_columns():
+    """Test behavior of adapt_columns method when receiving valid input."""
+    rows = [(1, 'a'), (2, None)]
+    assert adapt_columns(rows, (), str.upper) is rows
+    assert adapt_columns(rows, (1,), str.upper) == [(1, 'A'), (2, None)]
+
+
+def test_deduplicate():
+    """Test behavior of deduplicate method when receiving valid input."""
+    rows = [(1, 'a'), (2, 'b')]
+    assert deduplicate(rows, [0]) is rows
+    assert deduplicate([(1, 'a'), (2, 'b'), (1, 'c')], [0]) == \
+        [(1, 'c'), (2, 'b')]
+    assert deduplicate([(1, 1, 'a'), (1, 2, 'b'), (1, 1, 'c')], [0, 1]) == \
+        [(1, 1, 'c'), (1, 2, 'b')]
+
+
+def test_prefetch():
+    """Test behavior of prefetch method when receiving valid input."""
+    assert list(prefetch(range(10))) == list(range(10))
+    assert list(prefetch(range(10), size=3)) == list(range(10))
+
+
+def test_prefetch_with_failing_iterable():
+    """Test behavior of prefetch method when the iterable raises."""
+    def fail():
+        yield 1
+        raise RuntimeError('boom')
+
+    with pytest.raises(RuntimeError):
+        list(prefetch(fail()))